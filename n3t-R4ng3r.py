@@ -5,15 +5,17 @@ Efficiently scans large network ranges with proper resource management
 """
 
 import argparse
+import asyncio
+import itertools
+import shutil
 import subprocess
 import sys
-import threading
+import tempfile
 import time
 import ipaddress
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
-import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 
 def script_banner():
     print(r"""
@@ -28,16 +30,48 @@ def script_banner():
                                                                                                                                                                          
 """)
 
+def summarize_batch_xml(xml_path):
+    """Single pass over a batch's XML: open-port summaries plus host elements"""
+    summaries = []
+    fragments = []
+    for event, host in ET.iterparse(xml_path, events=('end',)):
+        if host.tag != 'host':
+            continue
+
+        fragments.append(ET.tostring(host, encoding='unicode'))
+
+        addr = host.find('address')
+        status = host.find('status')
+        if addr is not None and status is not None \
+                and status.get('state') == 'up':
+            open_ports = []
+            for port in host.iter('port'):
+                state = port.find('state')
+                if state is not None and state.get('state') == 'open':
+                    open_ports.append(
+                        f"{port.get('portid')}/{port.get('protocol')}")
+
+            if open_ports:
+                summaries.append((addr.get('addr'), open_ports))
+
+        host.clear()
+    return summaries, ''.join(fragments)
+
 class NetworkScanner:
-    def __init__(self, target_range, max_threads=50, delay=0.1):
+    def __init__(self, target_range, max_threads=50, delay=0.1, fast_discovery=False):
         self.target_range = target_range
         self.max_threads = max_threads
         self.delay = delay
-        self.results_queue = Queue()
-        self.active_scans = 0
-        self.completed_scans = 0
+        self.fast_discovery = fast_discovery
+        self.has_masscan = False
+        self.nmap_path = None
+        self.masscan_path = None
+        self.results = []
+        self.nmap_file = None
+        self.gnmap_file = None
+        self.xml_file = None
+        self._batches_done = itertools.count(1)
         self.total_hosts = 0
-        self.lock = threading.Lock()
         
         try:
             self.network = ipaddress.IPv4Network(target_range, strict=False)
@@ -51,162 +85,286 @@ class NetworkScanner:
         range_clean = target_range.replace('/', '_').replace('.', '-')
         self.output_base = f"{range_clean}-network"
         
-    def check_nmap_installed(self):
-        """Check if nmap is installed and accessible"""
-        try:
-            subprocess.run(['nmap', '--version'], capture_output=True, check=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
+    def check_tools(self):
+        """Locate the required scan tools without spawning them"""
+        self.nmap_path = shutil.which('nmap')
+        if self.nmap_path is None:
             print("Error: nmap is not installed or not in PATH")
             return False
+
+        if self.fast_discovery:
+            self.masscan_path = shutil.which('masscan')
+            self.has_masscan = self.masscan_path is not None
+            if not self.has_masscan:
+                print("Warning: masscan not found, using nmap for discovery")
+
+        return True
     
     def ping_sweep(self):
         """Perform initial ping sweep to identify live hosts"""
         print(f"[*] Starting ping sweep on {self.target_range}")
         print(f"[*] Scanning {self.total_hosts} potential hosts...")
         
-        cmd = [
-            'nmap', '-sn', '-T4', '--max-retries', '1',
-            '--host-timeout', '3s', str(self.target_range)
-        ]
-        
+        use_masscan = (self.fast_discovery and self.has_masscan
+                       and self.total_hosts > 4096)
+
+        if use_masscan:
+            print("[*] Using masscan for fast discovery")
+            cmd = [
+                self.masscan_path, '--ping', '--rate', '10000',
+                '-oG', '-', str(self.target_range)
+            ]
+        else:
+            cmd = [
+                self.nmap_path, '-sn', '-n', '-T4', '--max-retries', '1',
+                '--host-timeout', '3s', '-oG', '-', str(self.target_range)
+            ]
+
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            live_hosts = []
-            
-            for line in result.stdout.split('\n'):
-                if 'Nmap scan report for' in line:
-                    ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-                    if ip_match:
-                        live_hosts.append(ip_match.group(1))
-            
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    timeout=300, close_fds=False)
+            live_hosts = set()
+
+            for line in result.stdout.splitlines():
+                if line.startswith('#') or 'Host: ' not in line:
+                    continue
+                if 'Status: Up' not in line and 'Ports:' not in line:
+                    continue
+                live_hosts.add(line.split('Host: ', 1)[1].split()[0])
+
             print(f"[+] Found {len(live_hosts)} live hosts")
-            return live_hosts
-            
+            return sorted(live_hosts, key=ipaddress.IPv4Address)
+
         except subprocess.TimeoutExpired:
             print("[-] Ping sweep timed out, proceeding with full range scan")
-            return [str(ip) for ip in self.network.hosts()]
+            return [self.target_range]
         except Exception as e:
             print(f"[-] Ping sweep failed: {e}")
-            return [str(ip) for ip in self.network.hosts()]
+            return [self.target_range]
     
-    def scan_host(self, host_ip):
-        """Perform detailed scan on a single host"""
-        with self.lock:
-            self.active_scans += 1
-            
+    async def fast_scan_batch(self, batch_idx, hosts):
+        """Triage a batch with a fast top-ports scan; returns hosts worth a deep scan"""
+        async with self.scan_semaphore:
+            target_file = None
+            gnmap_file = f"{self.output_base}_fast_{batch_idx}.gnmap"
+            responsive = []
+            try:
+                with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as tmp:
+                    tmp.write('\n'.join(hosts) + '\n')
+                    target_file = tmp.name
+
+                cmd = [
+                    self.nmap_path, '-sS', '-n', '-T4',
+                    '--top-ports', '1000',
+                    '--max-retries', '1',
+                    '--host-timeout', '60s',
+                    '-iL', target_file,
+                    '-oG', gnmap_file
+                ]
+
+                print(f"[*] Triaging batch {batch_idx + 1} ({len(hosts)} hosts)")
+
+                # close_fds=False keeps CPython on the posix_spawn fast path
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=False
+                )
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=600)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    print(f"[-] Triage timeout for batch {batch_idx + 1}")
+                    return hosts
+
+                if proc.returncode != 0 or not os.path.exists(gnmap_file):
+                    print(f"[-] Triage failed for batch {batch_idx + 1}")
+                    return hosts
+
+                with open(gnmap_file) as f:
+                    for line in f:
+                        if line.startswith('Host: ') and '/open/' in line:
+                            responsive.append(line.split()[1])
+
+                return responsive
+
+            except Exception as e:
+                print(f"[-] Error triaging batch {batch_idx + 1}: {e}")
+                return hosts
+            finally:
+                for path in (target_file, gnmap_file):
+                    if path:
+                        try:
+                            os.unlink(path)
+                        except OSError:
+                            pass
+
+    async def deep_scan_batch(self, batch_idx, hosts):
+        """Perform detailed scan on a batch of hosts with a single nmap run"""
+        async with self.scan_semaphore:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+
+            target_file = None
+            try:
+                with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as tmp:
+                    tmp.write('\n'.join(hosts) + '\n')
+                    target_file = tmp.name
+
+                partial_base = f"{self.output_base}_partial_{batch_idx}"
+                cmd = [
+                    self.nmap_path, '-sS', '-sC', '-sV', '-T4',
+                    '--max-retries', '2',
+                    '--host-timeout', '10m',
+                    '-p-',
+                    '-iL', target_file,
+                    '-oA', partial_base
+                ]
+
+                print(f"[*] Scanning batch {batch_idx + 1} ({len(hosts)} hosts)")
+
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=False
+                )
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=3600)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    print(f"[-] Scan timeout for batch {batch_idx + 1}")
+                    return
+
+                if proc.returncode != 0:
+                    print(f"[-] nmap exited with code {proc.returncode} "
+                          f"for batch {batch_idx + 1}")
+                elif os.path.exists(f"{partial_base}.xml"):
+                    await self.process_batch_output(f"{partial_base}.xml")
+                    self.merge_partial(partial_base)
+
+            except Exception as e:
+                print(f"[-] Error scanning batch {batch_idx + 1}: {e}")
+            finally:
+                if target_file:
+                    try:
+                        os.unlink(target_file)
+                    except OSError:
+                        pass
+                print(f"[*] Deep scan batch {batch_idx + 1} finished "
+                      f"({next(self._batches_done)}/{self.deep_batch_total})")
+
+    async def process_batch_output(self, xml_path):
+        """Summarize a batch's XML output and merge its hosts into the final XML"""
+        loop = asyncio.get_running_loop()
         try:
-            cmd = [
-                'nmap', '-sS', '-sC', '-sV', '-T4',
-                '--max-retries', '2',
-                '--host-timeout', '10m',
-                '-p-', 
-                host_ip
-            ]
-            
-            print(f"[*] Scanning {host_ip} ({self.completed_scans + 1}/{len(self.live_hosts)})")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=900)
-            
-            if result.returncode == 0 and 'open' in result.stdout.lower():
-                self.process_scan_result(host_ip, result.stdout)
-                
-            time.sleep(self.delay)
-            
-        except subprocess.TimeoutExpired:
-            print(f"[-] Scan timeout for {host_ip}")
-        except Exception as e:
-            print(f"[-] Error scanning {host_ip}: {e}")
-        finally:
-            with self.lock:
-                self.active_scans -= 1
-                self.completed_scans += 1
-    
-    def process_scan_result(self, host_ip, nmap_output):
-        """Process and display scan results in real-time"""
-        print(f"\n{'='*60}")
-        print(f"[+] RESULTS for {host_ip}")
-        print(f"{'='*60}")
-
-        in_port_section = False
-        open_ports = []
-        
-        for line in nmap_output.split('\n'):
-            if 'PORT' in line and 'STATE' in line:
-                in_port_section = True
-                print(line)
-                continue
-            elif in_port_section and line.strip():
-                if '/tcp' in line or '/udp' in line:
-                    print(line)
-                    parts = line.split()
-                    if len(parts) >= 3 and 'open' in parts[1]:
-                        open_ports.append(parts[0])
-                elif line.startswith('|'):
-                    print(line)
-                else:
-                    in_port_section = False
-        
-        if open_ports:
-            print(f"\n[+] {host_ip} - Open ports: {', '.join(open_ports)}")
-        
-        self.results_queue.put((host_ip, nmap_output))
-        print(f"{'='*60}\n")
-    
+            summaries, host_xml = await loop.run_in_executor(
+                self.parser_pool, summarize_batch_xml, xml_path)
+        except ET.ParseError as e:
+            print(f"[-] Error parsing {xml_path}: {e}")
+            return
+
+        self.xml_file.write(host_xml)
+        for host_ip, open_ports in summaries:
+            self.process_scan_result(host_ip, open_ports)
+
+    def process_scan_result(self, host_ip, open_ports):
+        """Display a short per-host summary and record it"""
+        print(f"[+] {host_ip} - Open ports: {', '.join(open_ports)}")
+        self.results.append((host_ip, open_ports))
+
+    def open_output_files(self):
+        """Open the final output files for streaming batch results"""
+        buf_size = 1 << 20
+        self.nmap_file = open(f"{self.output_base}.nmap", 'w', buffering=buf_size)
+        self.nmap_file.write(f"# Network scan results for {self.target_range}\n")
+        self.nmap_file.write(f"# Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+        self.gnmap_file = open(f"{self.output_base}.gnmap", 'w', buffering=buf_size)
+
+        self.xml_file = open(f"{self.output_base}.xml", 'w', buffering=buf_size)
+        self.xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.xml_file.write('<nmaprun>\n')
+
+    def merge_partial(self, partial_base):
+        """Append a completed batch's partial files to the final outputs"""
+        with open(f"{partial_base}.nmap") as src:
+            shutil.copyfileobj(src, self.nmap_file, 1 << 20)
+        self.nmap_file.write("\n")
+
+        with open(f"{partial_base}.gnmap") as src:
+            shutil.copyfileobj(src, self.gnmap_file, 1 << 20)
+
+        for ext in ('xml', 'nmap', 'gnmap'):
+            try:
+                os.unlink(f"{partial_base}.{ext}")
+            except OSError:
+                pass
+
     def save_results(self):
-        """Save all results to output files"""
-        print(f"[*] Saving results to {self.output_base}.*")
-        
-        all_results = []
-        while not self.results_queue.empty():
-            all_results.append(self.results_queue.get())
-        
-        if not all_results:
+        """Finalize the streamed output files"""
+        if self.xml_file is None:
             print("[-] No results to save")
             return
-        
+
+        print(f"[*] Saving results to {self.output_base}.*")
+
         try:
-            with open(f"{self.output_base}.xml", 'w') as f:
-                f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                f.write('<nmaprun>\n')
-                for host_ip, output in all_results:
-                    f.write(f'  <host ip="{host_ip}">\n')
-                    f.write(f'    <output><![CDATA[{output}]]></output>\n')
-                    f.write('  </host>\n')
-                f.write('</nmaprun>\n')
-            
-            # Normal text format
-            with open(f"{self.output_base}.nmap", 'w') as f:
-                f.write(f"# Network scan results for {self.target_range}\n")
-                f.write(f"# Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                for host_ip, output in all_results:
-                    f.write(f"{'='*60}\n")
-                    f.write(f"Host: {host_ip}\n")
-                    f.write(f"{'='*60}\n")
-                    f.write(output)
-                    f.write("\n\n")
-            
-            with open(f"{self.output_base}.gnmap", 'w') as f:
-                for host_ip, output in all_results:
-                    ports = []
-                    for line in output.split('\n'):
-                        if '/tcp' in line and 'open' in line:
-                            port_match = re.match(r'(\d+/tcp)', line)
-                            if port_match:
-                                ports.append(port_match.group(1))
-                    
-                    if ports:
-                        f.write(f"Host: {host_ip} () Status: Up\n")
-                        f.write(f"Host: {host_ip} () Ports: {'/'.join(ports)}\n")
-            
+            self.xml_file.write('</nmaprun>\n')
+            for output_file in (self.nmap_file, self.gnmap_file, self.xml_file):
+                output_file.flush()
+                output_file.close()
+
             print(f"[+] Results saved to {self.output_base}.{{xml,nmap,gnmap}}")
-            
+
         except Exception as e:
             print(f"[-] Error saving results: {e}")
+        finally:
+            self.nmap_file = self.gnmap_file = self.xml_file = None
     
+    def make_batches(self, hosts, batch_size=64):
+        """Chunk a host list into nmap-sized batches"""
+        return [hosts[i:i + batch_size]
+                for i in range(0, len(hosts), batch_size)]
+
+    async def run_batches(self, batches):
+        """Fast-triage every batch, then deep-scan only the responsive hosts"""
+        self.scan_semaphore = asyncio.Semaphore(min(self.max_threads, len(batches)))
+
+        triage = await asyncio.gather(
+            *(self.fast_scan_batch(idx, batch) for idx, batch in enumerate(batches)),
+            return_exceptions=True
+        )
+        responsive = []
+        for idx, result in enumerate(triage):
+            if isinstance(result, Exception):
+                print(f"[-] Triage failed for batch {idx + 1}, keeping its hosts: {result}")
+                responsive.extend(batches[idx])
+            else:
+                responsive.extend(result)
+
+        if not responsive:
+            print("[-] No hosts with open ports found during triage")
+            return
+
+        print(f"[*] {len(responsive)} hosts promoted to deep scan")
+        deep_batches = self.make_batches(responsive)
+        self.deep_batch_total = len(deep_batches)
+
+        results = await asyncio.gather(
+            *(self.deep_scan_batch(idx, batch) for idx, batch in enumerate(deep_batches)),
+            return_exceptions=True
+        )
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"[-] Failed to scan batch {idx + 1}: {result}")
+
     def run_scan(self):
         """Main scanning function"""
-        if not self.check_nmap_installed():
+        if not self.check_tools():
             return False
         
         print(f"[*] Starting managed network scan")
@@ -222,25 +380,24 @@ class NetworkScanner:
             print("[-] No live hosts found")
             return False
         
-        print(f"[*] Starting detailed scans on {len(self.live_hosts)} hosts")
-        print(f"[*] Using {min(self.max_threads, len(self.live_hosts))} concurrent threads")
-        
-        with ThreadPoolExecutor(max_workers=min(self.max_threads, len(self.live_hosts))) as executor:
-            futures = {executor.submit(self.scan_host, host): host for host in self.live_hosts}
-            
-            for future in as_completed(futures):
-                host = futures[future]
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"[-] Failed to scan {host}: {e}")
+        batches = self.make_batches(self.live_hosts)
+
+        print(f"[*] Starting scans on {len(self.live_hosts)} hosts")
+        print(f"[*] Using {len(batches)} batches of up to 64 hosts")
+
+        self.open_output_files()
+        self.parser_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        try:
+            asyncio.run(self.run_batches(batches))
+        finally:
+            self.parser_pool.shutdown()
         
         self.save_results()
         
         elapsed_time = time.time() - start_time
         print(f"\n[+] Scan completed in {elapsed_time:.2f} seconds")
         print(f"[+] Scanned {len(self.live_hosts)} live hosts")
-        print(f"[+] Found results for {self.results_queue.qsize()} hosts")
+        print(f"[+] Found results for {len(self.results)} hosts")
         
         return True
 
@@ -262,14 +419,17 @@ Examples:
                        help='Maximum concurrent threads (default: 50)')
     parser.add_argument('--delay', type=float, default=0.1,
                        help='Delay between scans in seconds (default: 0.1)')
-    
+    parser.add_argument('--fast-discovery', action='store_true',
+                       help='Use masscan for host discovery on large ranges')
+
     args = parser.parse_args()
     
     if args.threads < 1 or args.threads > 200:
         print("Error: Thread count must be between 1 and 200")
         sys.exit(1)
     
-    scanner = NetworkScanner(args.range, args.threads, args.delay)
+    scanner = NetworkScanner(args.range, args.threads, args.delay,
+                             args.fast_discovery)
     
     try:
         success = scanner.run_scan()